@@ -20,15 +20,42 @@ from abc import ABC
 import httpx
 
 from ..http import HttpMethod, HttpStatus
-from ..http.cache import CachableHttpClient
+from ..http.cache import REVALIDATE_EXTENSION, CachableHttpClient, get_shared_client
+from ..utils import serialization
 from ..utils.config import AlltrueConfig
 from ._internal.token import TokenRetriever
 
-MAX_TOKEN_REFRESH_RETRIES = 3
+# one attempt with the current token, then one with a refreshed token before failing
+MAX_TOKEN_REFRESH_RETRIES = 2
+CONNECT_TIMEOUT_CAP = 2.0  # seconds
+
+# bound once, checked on every request
+_is_unauthorized = HttpStatus.is_unauthorized
 
 logfire = configure_logfire()
 
 
+def _cache_extensions(cache: bool, revalidate: bool) -> dict[str, bool]:
+    if not cache:
+        return {"cache_disabled": True}
+    elif revalidate:
+        # leave it to the cache controller, which sends conditional requests with
+        # the validators (ETag/Last-Modified) of a stale cached response, if any
+        return {REVALIDATE_EXTENSION: True}
+    else:
+        return {"force_cache": True}
+
+
+def _stage_timeout(timeout: float | None) -> httpx.Timeout | None:
+    if timeout is None:
+        return None
+    # a stalled connect (e.g. slow TLS handshake) should not use up the whole budget
+    return httpx.Timeout(
+        timeout,
+        connect=min(timeout, CONNECT_TIMEOUT_CAP),
+    )
+
+
 class AlltrueAPIClient(ABC):
     """
     Client to interact with Alltrue APIs
@@ -57,16 +84,15 @@ class AlltrueAPIClient(ABC):
                 api_key=api_key,
                 llm_api_provider=llm_api_provider,
             )
-            self.log.info(
-                f"Initiated with config: {self.config.model_dump_json(indent=2, exclude={'llm_api_provider'})}"
-            )
+            self.log.info("Initiated with API URL: %s", self.config.api_url)
 
         _client = kwargs.pop("_client", None)
         if isinstance(_client, CachableHttpClient):
             self._client = _client
         else:
-            self._client = CachableHttpClient(
+            self._client = get_shared_client(
                 base_url=self.config.api_url,  # type: ignore
+                api_key=self.config.api_key,
                 logger=self.log,
                 keep_alive=_keep_alive,
                 timeout=_timeout,
@@ -82,50 +108,63 @@ class AlltrueAPIClient(ABC):
         self,
         endpoint: str,
         method: HttpMethod = "POST",
-        body: dict | None = None,
+        body: dict | bytes | None = None,
         headers: list[tuple[str, str]] | None = None,
         timeout: float | None = None,
         cache: bool = False,
+        revalidate: bool = False,
     ) -> httpx.Response:
         """
         Call the Control Plane API , retrying if we get a 403 Forbidden in case token has expired
         :param endpoint: The chat api endpoint
         :param method: The HTTP method to use
-        :param body: The original body of the request
+        :param body: The original body of the request, either as a dict or already serialized JSON bytes
         :param headers: The HTTP headers to use
         :param timeout: timeout setting per request level if given
         :param cache: Should cache the response when sufficient
+        :param revalidate: Reuse a cached response only while fresh, revalidating it with the server otherwise
         :return: HTTPX reply
         """
+        # serialized once up front, not again on every retry
+        content = (
+            body
+            if isinstance(body, bytes) or body is None
+            else serialization.dumps(body)
+        )
         token_error_count = 0
         while token_error_count < MAX_TOKEN_REFRESH_RETRIES:
             token = await self._token_manager.get_token(
                 refresh=token_error_count > 0,
             )
             if token:
-                self.log.debug(f"{method} {endpoint} | token: {token} | body: {body}")
+                request_headers = {
+                    "content-type": "application/json",
+                    "Authorization": f"Bearer {token}",
+                }
+                if headers:
+                    # takes header pairs as is
+                    request_headers.update(headers)
+                if self.log.isEnabledFor(logging.DEBUG):
+                    self.log.debug(
+                        "%s %s | token: %s | body: %s", method, endpoint, token, body
+                    )
                 reply = await self._client.request(
                     method=method,
                     url=endpoint,
-                    json=body,
-                    headers={
-                        "content-type": "application/json",
-                        "Authorization": f"Bearer {token}",
-                        **dict(headers or []),
-                    },
-                    timeout=timeout,
-                    extensions={"force_cache": True}
-                    if cache
-                    else {"cache_disabled": True},
+                    content=content,
+                    headers=request_headers,
+                    timeout=_stage_timeout(timeout),
+                    extensions=_cache_extensions(cache, revalidate),
                 )
 
-                if not HttpStatus.is_unauthorized(reply.status_code):
+                if not _is_unauthorized(reply.status_code):
                     return reply
 
             token_error_count += 1
             self.log.info(
-                "Auth failed with Control Plane API,"
-                f"retrying {token_error_count} out of {MAX_TOKEN_REFRESH_RETRIES}"
+                "Auth failed with Control Plane API, retrying %d out of %d",
+                token_error_count,
+                MAX_TOKEN_REFRESH_RETRIES,
             )
         else:
             self.log.warning(
@@ -13,22 +13,48 @@
 #  limitations under the License.
 #
 
-import json
+import asyncio
+import base64
 import logging
+import time
 
 import httpcore
 
 from ...http import HttpStatus
 from ...http.cache import CachableEndpoint, CachableHttpClient
+from ...utils import serialization
 from ...utils.config import AlltrueConfig
 
 _TOKEN_ENDPOINT = "/v1/auth/issue-jwt-token"
+# tokens this close to expiry (in seconds, or by the fraction of their lifetime if shorter) are renewed
+_TOKEN_EXPIRY_MARGIN = 30.0
+_TOKEN_EXPIRY_MARGIN_RATIO = 0.25
+# tokens this close to expiry (same as above) are renewed in the background
+_TOKEN_REFRESH_AHEAD = 60.0
+_TOKEN_REFRESH_AHEAD_RATIO = 0.5
+# request extension carrying the api key along, so the cache key needs no body lookup
+_CACHE_KEY_EXTENSION = "alltrue_cache_key"
+_is_success = HttpStatus.is_success
 
 
 def _gen_cache_key(request: httpcore.Request, body: bytes = b"") -> bytes:
-    return (
-        json.loads(body.decode("utf-8")).get("api_key", "invalid-key").encode("utf-8")
-    )
+    api_key = request.extensions.get(_CACHE_KEY_EXTENSION)
+    if api_key:
+        return api_key.encode("utf-8")
+    # the body only carries the api key, so the same key always makes the same body
+    return body
+
+
+def _get_token_expiry(token: str) -> float | None:
+    """
+    Read the expiry (unix timestamp) from the claims of the given JWT, if any
+    """
+    try:
+        claims = token.split(".")[1]
+        claims += "=" * (-len(claims) % 4)
+        return float(serialization.loads(base64.urlsafe_b64decode(claims))["exp"])
+    except Exception:
+        return None
 
 
 class TokenRetriever:
@@ -47,6 +73,14 @@ class TokenRetriever:
 
         self._config = config
         self._client = client
+        # in-memory token with its expiry on the monotonic clock and its lifetime
+        self._cached: tuple[float, float, str] | None = None
+        self._refresh_task: asyncio.Task | None = None
+        # only one retrieval at a time, concurrent callers reuse the token it retrieved;
+        # counted along with the last token of any retrieval, and of refreshes only
+        self._lock = asyncio.Lock()
+        self._retrieved: tuple[int, str | None] = (0, None)
+        self._refreshed: tuple[int, str | None] = (0, None)
         self._client.register_cachable(
             CachableEndpoint(
                 path=_TOKEN_ENDPOINT,
@@ -55,6 +89,12 @@ class TokenRetriever:
             )
         )
 
+    async def _refresh(self) -> None:
+        try:
+            await self.get_token(refresh=True)
+        except Exception as e:
+            self.log.warning("Failed to refresh access token", exc_info=e)
+
     async def get_token(
         self,
         refresh: bool = False,
@@ -63,20 +103,60 @@ class TokenRetriever:
         This function is used to get the internal access token
         :param refresh: force to retrieve a fresh access token and then recache it, if successful
         """
+        if not refresh and self._cached is not None:
+            expiry, lifetime, token = self._cached
+            remaining = expiry - time.monotonic()
+            if remaining > min(
+                _TOKEN_EXPIRY_MARGIN, lifetime * _TOKEN_EXPIRY_MARGIN_RATIO
+            ):
+                if remaining < min(
+                    _TOKEN_REFRESH_AHEAD, lifetime * _TOKEN_REFRESH_AHEAD_RATIO
+                ) and (self._refresh_task is None or self._refresh_task.done()):
+                    # renew in the background before expiry, keep serving the current one meanwhile
+                    self._refresh_task = asyncio.create_task(self._refresh())
+                return token
+            # about to expire, so not to be served from the HTTP cache either
+            refresh = True
+
+        # a refresh only shares another refresh, not a token possibly served from cache
+        generation = (self._refreshed if refresh else self._retrieved)[0]
+        async with self._lock:
+            latest, retrieved = self._refreshed if refresh else self._retrieved
+            if latest != generation and retrieved is not None:
+                # retrieved by a concurrent caller while waiting
+                return retrieved
+            retrieved = await self._retrieve(refresh)
+            self._retrieved = (self._retrieved[0] + 1, retrieved)
+            if refresh:
+                self._refreshed = (self._refreshed[0] + 1, retrieved)
+            return retrieved
+
+    async def _retrieve(self, refresh: bool) -> str | None:
+        api_key = self._config.api_key
         response = await self._client.post(
             url=_TOKEN_ENDPOINT,
             json={
-                "api_key": self._config.api_key,
+                "api_key": api_key,
+            },
+            extensions={
+                _CACHE_KEY_EXTENSION: api_key,
+                **({"cache_disabled": True} if refresh else {"force_cache": True}),
             },
-            extensions={"cache_disabled": True} if refresh else {"force_cache": True},
         )
-        if HttpStatus.is_success(response.status_code):
-            payload = response.json()
+        if _is_success(response.status_code):
+            payload = serialization.loads(response.content)
             if "access_token" in payload:
-                return payload["access_token"]
+                token = payload["access_token"]
+                expiry = _get_token_expiry(token)
+                if expiry is not None:
+                    lifetime = expiry - time.time()
+                    self._cached = (time.monotonic() + lifetime, lifetime, token)
+                else:
+                    self._cached = None
+                return token
             else:
-                self.log.warning(f"Failed to get access token: {payload}")
+                self.log.warning("Failed to get access token: %s", payload)
                 return None
         else:
-            self.log.warning(f"Failed to get access token: {response.text}")
+            self.log.warning("Failed to get access token: %s", response.text)
             return None
@@ -14,100 +14,222 @@
 #
 
 import asyncio
+import functools
 import itertools
-import json
 import logging
-import re
-import uuid
-from typing import Any, Callable, Coroutine, NamedTuple
+from typing import Any, Callable, Coroutine
 
 import httpx
-from async_batcher.batcher import AsyncBatcher
 from typing_extensions import override
 
 from ..http import HttpMethod, HttpStatus
+from ..utils import serialization
 from .chat import RuleProcessor
 
 _DEFAULT_BATCH_TIMEOUT = 3.0
+# ids to tell batches apart in logs
+_BATCH_IDS = itertools.count()
+_is_error = HttpStatus.is_error
 
+# replies for batched requests echo the original payload, which is already serialized JSON
+_BATCHED_INPUT_REPLY = (
+    b'{"status_code":200,"processed_input":%b,"message":"Reqeust batched"}'
+)
+_BATCHED_OUTPUT_REPLY = (
+    b'{"status_code":200,"processed_output":%b,"message":"Reqeust batched"}'
+)
 
-class _Request(NamedTuple):
-    endpoint: str
-    method: HttpMethod
-    body: dict | None
 
+def _to_batch_endpoint(endpoint: str) -> str:
+    return f"/batch/{endpoint.removeprefix('/')}"
 
-class _BatchCaller(AsyncBatcher[_Request, httpx.Response]):
+
+class _BatchCaller:
     """
-    Internal usage to call control batch APIs by batch
+    Internal usage to call a control batch API by batch, one caller per endpoint.
+    Queued bodies are collected by a single task into batches of up to the max batch size,
+    or whatever is queued once the first body waited for the max queue time,
+    with up to `concurrency` batches being sent at once.
     """
 
     def __init__(
         self,
         *,
         func: Callable[
-            [str, HttpMethod, dict | None, float | None, bool],
+            [str, HttpMethod, dict | bytes | None, float | None, bool],
             Coroutine[Any, Any, httpx.Response],
         ],
+        endpoint: str,
+        method: HttpMethod,
         logger: logging.Logger,
-        **kwargs,
+        max_batch_size: int = 5,
+        max_queue_time: float = _DEFAULT_BATCH_TIMEOUT,
+        concurrency: int = 1,
     ):
-        super().__init__(
-            **kwargs,
-        )
         self._func = func
-        self._key_func = lambda r: f"[{r.method}]{r.endpoint}"
+        self._endpoint = _to_batch_endpoint(endpoint)
+        self._method = method
         self.log = logger
+        self._max_batch_size = max(1, max_batch_size)
+        self._max_queue_time = max_queue_time
+        self._queue: asyncio.Queue[tuple[dict | None, asyncio.Future]] = asyncio.Queue()
+        self._collector: asyncio.Task | None = None
+        self._senders: set[asyncio.Task] = set()
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+
+    async def process(self, body: dict | None) -> None:
+        """
+        Queue the given body and wait until the batch including it has been handled
+        """
+        # (re)start the collector, in case it was cancelled or has not been started yet
+        if self._collector is None or self._collector.done():
+            self._collector = asyncio.create_task(self._collect())
+        done = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((body, done))
+        await done
+
+    async def _collect(self) -> None:
+        while True:
+            # wait for a free sender first, so bodies queued meanwhile make it into the next batch
+            await self._slots.acquire()
+            # collected into a list owned here, so nothing taken off the queue goes unanswered
+            items: list[tuple[dict | None, asyncio.Future]] = []
+            try:
+                await self._fill(items)
+            except BaseException:
+                self._slots.release()
+                self._finish(items, RuntimeError("Batch worker stopped"))
+                raise
+            sender = asyncio.create_task(
+                self.process_batch([body for body, _ in items])
+            )
+            self._senders.add(sender)
+            sender.add_done_callback(functools.partial(self._sent, items))
+
+    async def _fill(self, items: list[tuple[dict | None, asyncio.Future]]) -> None:
+        items.append(await self._queue.get())
+        deadline = asyncio.get_running_loop().time() + self._max_queue_time
+        while len(items) < self._max_batch_size:
+            try:
+                # take whatever is queued already, then wait no longer than the deadline
+                items.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    async with asyncio.timeout(remaining):
+                        items.append(await self._queue.get())
+                except TimeoutError:
+                    break
+
+    def _sent(
+        self,
+        items: list[tuple[dict | None, asyncio.Future]],
+        sender: asyncio.Task,
+    ) -> None:
+        # as a done callback, so the items are answered even if cancelled before starting
+        self._senders.discard(sender)
+        self._slots.release()
+        if sender.cancelled():
+            self._finish(items, RuntimeError("Batch worker stopped"))
+            return
+        error = sender.exception()
+        if error is not None:
+            self.log.error("Batch sender failed", exc_info=error)
+        self._finish(items, error)
+
+    def _finish(
+        self,
+        items: list[tuple[dict | None, asyncio.Future]],
+        error: BaseException | None = None,
+    ) -> None:
+        self._resolve(items, error)
+        for _ in items:
+            self._queue.task_done()
 
-    async def process_batch(self, batch: list[_Request]) -> list[httpx.Response] | None:
-        _batch_id = str(uuid.uuid4())[:8]
+    @staticmethod
+    def _resolve(
+        items: list[tuple[dict | None, asyncio.Future]],
+        error: BaseException | None = None,
+    ) -> None:
+        for _, done in items:
+            if done.done():
+                # given up on by the caller
+                continue
+            if error is None:
+                done.set_result(None)
+            else:
+                done.set_exception(error)
+
+    async def process_batch(self, batch: list[dict | None]) -> None:
+        _batch_id = f"{next(_BATCH_IDS):08x}"
         self.log.debug(
-            f"Batch:{_batch_id} started handling {len(batch)} requests in queue..."
+            "Batch:%s started handling %d requests in queue...", _batch_id, len(batch)
         )
 
-        calls = []
-        for key, requests in itertools.groupby(
-            sorted(batch, key=self._key_func), key=self._key_func
-        ):
-            parsed_key = re.search(r"\[(.*)\](.*)", key)
-            if not parsed_key:
-                continue
-            (method, endpoint) = parsed_key.groups()
-            batch_endpoint = f"/batch/{endpoint.removeprefix('/')}"
-            batch_body = [
-                request.body
-                for request in filter(lambda r: r.body is not None, requests)
-            ]
-            calls.append(
-                self._func(
-                    batch_endpoint,
-                    method,  # type: ignore
-                    {"requests": batch_body} if len(batch_body) > 0 else None,
+        bodies = [body for body in batch if body is not None]
+        if not bodies:
+            self.log.debug("Batch:%s skipped with nothing to send", _batch_id)
+            return
+        try:
+            async with asyncio.timeout(_DEFAULT_BATCH_TIMEOUT):
+                response = await self._func(
+                    self._endpoint,
+                    self._method,
+                    serialization.dumps({"requests": bodies}),
                     _DEFAULT_BATCH_TIMEOUT,
                     False,  # no cache for batch
                 )
-            )
-        try:
-            responses = await asyncio.wait_for(
-                asyncio.gather(*calls, return_exceptions=True),
-                timeout=_DEFAULT_BATCH_TIMEOUT,
-            )
+            if _is_error(response.status_code):
+                self.log.warning(
+                    "Batch:%s request unsuccessful - %s:%s",
+                    _batch_id,
+                    response.status_code,
+                    response.text,
+                )
         except Exception as e:
-            responses = [e]
-        for response in responses:
-            match response:
-                case exc if isinstance(exc, Exception):
-                    self.log.warning(
-                        f"Batch:{_batch_id} exception occurred", exc_info=exc
+            self.log.warning("Batch:%s exception occurred", _batch_id, exc_info=e)
+        self.log.info("Batch:%s handled %d requests in queue", _batch_id, len(batch))
+
+    async def is_running(self) -> bool:
+        return self._collector is not None and not self._collector.done()
+
+    async def stop(self) -> None:
+        """
+        Wait for the queued bodies to be handled, then stop the collector and senders
+        """
+        try:
+            collector = self._collector
+            if collector is not None and not collector.done():
+                joined = asyncio.ensure_future(self._queue.join())
+                try:
+                    # nothing would drain the queue any more once the collector is gone
+                    await asyncio.wait(
+                        (joined, collector), return_when=asyncio.FIRST_COMPLETED
                     )
-                case res if isinstance(res, httpx.Response):
-                    if HttpStatus.is_error(res.status_code):
-                        self.log.warning(
-                            f"Batch:{_batch_id} request unsuccessful - {res.status_code}:{res.text}"
-                        )
-        self.log.info(f"Batch:{_batch_id} handled {len(batch)} requests in queue")
-        # no need to handle other results
-        return None
+                finally:
+                    joined.cancel()
+        finally:
+            # also when interrupted, e.g. timed out, not to leave tasks running
+            tasks = self.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def cancel(self) -> list[asyncio.Task]:
+        """
+        Cancel the collector and senders right away, failing the bodies still queued,
+        and return the cancelled tasks
+        """
+        tasks = list(self._senders)
+        if self._collector is not None:
+            tasks.append(self._collector)
+            self._collector = None
+        for task in tasks:
+            task.cancel()
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            self._finish([item], RuntimeError("Batch worker stopped"))
+        return tasks
 
 
 class BatchRuleProcessor(RuleProcessor):
@@ -134,12 +256,58 @@ class BatchRuleProcessor(RuleProcessor):
         )
 
         self.log = logging.getLogger("alltrue.api.batcher")
-        self._batcher = _BatchCaller(
-            func=super()._chat,
-            logger=self.log,
-            concurrency=3,
-            max_batch_size=batch_size,
-            max_queue_time=queue_time,
+        self._batch_size = batch_size
+        self._queue_time = queue_time
+        # one batcher per endpoint, created on demand, so batch size applies per endpoint
+        self._batchers: dict[tuple[HttpMethod, str], _BatchCaller] = {}
+        # endpoint markers routed to batching, with their payload field and reply template
+        self._routes = {
+            "/process-input/": functools.partial(
+                self._batch,
+                payload_key="original_request_body",
+                reply_template=_BATCHED_INPUT_REPLY,
+            ),
+            "/process-output/": functools.partial(
+                self._batch,
+                payload_key="original_response_body",
+                reply_template=_BATCHED_OUTPUT_REPLY,
+            ),
+        }
+
+    def _get_batcher(self, endpoint: str, method: HttpMethod) -> _BatchCaller:
+        batcher = self._batchers.get((method, endpoint))
+        if batcher is None:
+            batcher = _BatchCaller(
+                func=super()._chat,
+                endpoint=endpoint,
+                method=method,
+                logger=self.log,
+                concurrency=3,
+                max_batch_size=self._batch_size,
+                max_queue_time=self._queue_time,
+            )
+            self._batchers[(method, endpoint)] = batcher
+        return batcher
+
+    async def _batch(
+        self,
+        endpoint: str,
+        method: HttpMethod,
+        body: dict | bytes | None,
+        *,
+        payload_key: str,
+        reply_template: bytes,
+    ) -> httpx.Response:
+        # queued as dict, to be serialized along with the rest of the batch
+        request: dict | None = (
+            serialization.loads(body) if isinstance(body, bytes) else body
+        )
+        await self._get_batcher(endpoint, method).process(request)
+        self.log.debug("Reqeust %s batched", endpoint)
+        payload = request.get(payload_key) if isinstance(request, dict) else None
+        return httpx.Response(
+            status_code=HttpStatus.OK,
+            content=reply_template % (payload or "{}").encode("utf-8"),
         )
 
     @override
@@ -147,60 +315,58 @@ class BatchRuleProcessor(RuleProcessor):
         self,
         endpoint: str,
         method: HttpMethod = "POST",
-        body: dict | None = None,
+        body: dict | bytes | None = None,
         timeout: float | None = None,
         cache: bool = False,
+        revalidate: bool = False,
     ) -> httpx.Response:
-        matched = re.search(r"/process-(input|output)/.*", endpoint)
-        endpoint_type = matched.group(1) if matched else None
-        if endpoint_type is not None:
-            await self._batcher.process(
-                _Request(endpoint=endpoint, method=method, body=body)
-            )
-            self.log.debug(f"Reqeust {endpoint} batched")
-            payload_type = "request" if endpoint_type == "input" else "response"
-            return httpx.Response(
-                status_code=HttpStatus.OK,
-                content=json.dumps(
-                    {
-                        "status_code": HttpStatus.OK,
-                        f"processed_{endpoint_type}": json.loads(
-                            body.get(f"original_{payload_type}_body", "{}")
-                            if body
-                            else "{}"
-                        ),
-                        "message": "Reqeust batched",
-                    }
-                ),
-            )
-        else:
-            return await super()._chat(
-                endpoint=endpoint,
-                method=method,
-                body=body,
-                timeout=timeout,
-                cache=cache,
-            )
+        for marker, handler in self._routes.items():
+            if marker in endpoint:
+                return await handler(endpoint, method, body)
+        return await super()._chat(
+            endpoint=endpoint,
+            method=method,
+            body=body,
+            timeout=timeout,
+            cache=cache,
+            revalidate=revalidate,
+        )
 
     @property
     @override
     async def is_running(self) -> bool:
-        return all(await asyncio.gather(super().is_running, self._batcher.is_running()))
+        if not await super().is_running:
+            return False
+        for batcher in self._batchers.values():
+            if not await batcher.is_running():
+                return False
+        return True
 
     @override
     async def close(self, timeout: float | None = None) -> None:
         self.log.info("Closing batcher...")
         try:
-            await asyncio.wait_for(
-                asyncio.gather(
-                    super().close(),
-                    self._batcher.stop(),
-                ),
-                timeout=timeout,
-            )
+            # stop everything together, cancelling the rest once one fails or time is up
+            async with asyncio.timeout(timeout):
+                async with asyncio.TaskGroup() as group:
+                    group.create_task(super().close())
+                    for batcher in self._batchers.values():
+                        group.create_task(batcher.stop())
             self.log.info("Batcher closed!")
-        except TimeoutError:
+        except* TimeoutError:
             self.log.warning("Batcher closure timed out, some batches might be lost!")
+        except* Exception as eg:
+            self.log.warning("Batcher closure failed", exc_info=eg)
+        finally:
+            # not to leave tasks running, whether stopped in time or not
+            await asyncio.gather(
+                *[
+                    task
+                    for batcher in self._batchers.values()
+                    for task in batcher.cancel()
+                ],
+                return_exceptions=True,
+            )
 
     @classmethod
     def clone(
@@ -217,8 +383,8 @@ class BatchRuleProcessor(RuleProcessor):
                 _config=original.config,
                 _client=original._client,
                 logging_level=original.log.level,
-                batch_size=original._batcher.max_batch_size,
-                queue_time=original._batcher.max_queue_time,
+                batch_size=original._batch_size,
+                queue_time=original._queue_time,
             )
         else:
             return cls(
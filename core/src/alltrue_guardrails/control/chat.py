@@ -15,38 +15,77 @@
 
 from ..utils.logfire import configure_logfire
 import functools
-import json
 import logging
 import re
-from datetime import UTC, datetime
+import time
 from json import JSONDecodeError
-from typing import NamedTuple, Literal
+from operator import itemgetter
+from typing import Literal, NamedTuple, Sequence
+from urllib.parse import urlsplit
 
 import httpcore
 import httpx
 
 from ..http import HttpMethod, HttpStatus
 from ..http.cache import CachableEndpoint
+from ..utils import serialization
 from . import AlltrueAPIClient
 
 
-LLM_API_KEY_PATTERN = re.compile(r"(x-[\w\-]*key|[aA]uthorization)$")
+# header names are case-insensitive
+LLM_API_KEY_PATTERN = re.compile(r"(?:x-[\w\-]*key|authorization)\Z", re.IGNORECASE)
+# raw body fragments hinting that a cache key can be derived; the header name may be quote-escaped
+_CACHE_KEY_HINT_PATTERN = re.compile(
+    rb'"endpoint_identifier"|(?:x-[\w\-]*key|authorization)\\?"', re.IGNORECASE
+)
+# plain (unescaped) values to lift a cache key from without parsing the body,
+# header names may be quote-escaped as headers can be sent as a serialized string
+_ENDPOINT_IDENTIFIER_PATTERN = re.compile(rb'"endpoint_identifier"\s*:\s*"([^"\\]*)"')
+_LLM_API_KEY_HEADER_PATTERN = re.compile(
+    rb'\\?"(?:x-[\w\-]*key|authorization)\\?"\s*:\s*\\?"([^"\\]+)\\?"',
+    re.IGNORECASE,
+)
+_is_success = HttpStatus.is_success
+# session fields of each processed request type, and the trace field to collect them into
+_TRACE_KEYS = tuple(
+    (f"{req_type}_request", f"{req_type}_actions", f"{req_type}_process")
+    for req_type in ("input", "output")
+)
+# headers of processed prompts when none are given
+_DEFAULT_PROMPT_HEADERS = (("Content-Type", "application/json"),)
+# expected failures talking to the control plane, not worth a traceback
+_NETWORK_ERRORS = (httpx.HTTPError, TimeoutError, OSError)
+_DEFAULT_PORTS = {"http": 80, "https": 443, "ws": 80, "wss": 443}
+# serialized headers for connection checks without any headers given
+_EMPTY_HEADERS = serialization.dumps({}).decode("utf-8")
 logfire = configure_logfire()
 
 
+@functools.lru_cache(maxsize=256)
 def _parse_url(
     url: str,
     scheme: str | None = None,
     host: str | None = None,
     port: int | None = None,
-) -> dict[str, str | int]:
-    _origin = httpcore.URL(url).origin
-    return {
-        "url": url,
-        "host": host or _origin.host.decode("utf-8"),
-        "port": port or _origin.port,
-        "scheme": scheme or _origin.scheme.decode("utf-8"),
-    }
+) -> tuple[str, str, int, str]:
+    """
+    Parsed url attributes for the control plane payload, as (url, host, port, scheme)
+    """
+    _url = urlsplit(url)
+    return (
+        url,
+        host or _url.hostname or "",
+        port or _url.port or _DEFAULT_PORTS.get(_url.scheme, 0),
+        scheme or _url.scheme,
+    )
+
+
+@functools.lru_cache(maxsize=64)
+def _chat_path(endpoint: str) -> str:
+    """
+    Full path of the given chat API endpoint
+    """
+    return f"/v1/llm-firewall/chat/{endpoint.removeprefix('/')}"
 
 
 def _gen_cache_key(
@@ -55,8 +94,19 @@ def _gen_cache_key(
     """
     Cache key composed by api key and url path
     """
+    if not body.startswith(b"{") or _CACHE_KEY_HINT_PATTERN.search(body) is None:
+        # nothing to derive a key from, skip parsing the body
+        return body
+    matched = _ENDPOINT_IDENTIFIER_PATTERN.search(body)
+    if matched is not None:
+        return matched.group(1)
+    if b'"endpoint_identifier"' not in body:
+        matched = _LLM_API_KEY_HEADER_PATTERN.search(body)
+        if matched is not None:
+            return matched.group(1)
     try:
-        json_body = json.loads(body.decode("utf-8"))
+        # values not found plainly, e.g. escaped, are read from the parsed body
+        json_body = serialization.loads(body)
         endpoint_identifier = json_body.get("endpoint_identifier", None)
         if endpoint_identifier is not None:
             return endpoint_identifier.encode("utf-8")
@@ -64,8 +114,9 @@ def _gen_cache_key(
         headers = json_body.get("headers", [])
         if len(headers) == 0:
             headers = json_body.get("llm_api_request", {}).get("request_headers", [])
+        # sent as an object, pairs or serialized either way
         for attr, val in dict(
-            json.loads(headers) if isinstance(headers, str) else headers
+            serialization.loads(headers) if isinstance(headers, str) else headers
         ).items():
             if LLM_API_KEY_PATTERN.match(attr) is not None:
                 return val.encode("utf-8")
@@ -106,28 +157,35 @@ class RuleProcessor(AlltrueAPIClient):
             CachableEndpoint(
                 path="/v1/llm-firewall/chat/check-connection/",
                 methods=["POST"],
-                key_generator=functools.partial(
-                    _gen_cache_key,
-                    logger=self.log,
-                ),
+                key_generator=self._cache_key,
             )
         )
         self._client.register_cachable(
             CachableEndpoint(
                 path="/v1/ai-usage/quarantine/llm-endpoint",
                 methods=["POST"],
-                key_generator=functools.partial(
-                    _gen_cache_key,
-                    logger=self.log,
-                ),
+                key_generator=self._cache_key,
             )
         )
+        self._endpoints: dict[tuple[str, str | None], str] = {}
+
+    def _cache_key(self, request: httpcore.Request, body: bytes = b"") -> bytes:
+        return _gen_cache_key(request, body, self.log)
+
+    def _endpoint_for(self, kind: str, provider: str | None) -> str:
+        """
+        Chat endpoint of the given kind for the given provider, composed once and then reused
+        """
+        endpoint = self._endpoints.get((kind, provider))
+        if endpoint is None:
+            endpoint = self._endpoints[(kind, provider)] = f"/{kind}/{provider}"
+        return endpoint
 
     @logfire.instrument("Calling AI Usage API")
     async def check_usage(
         self,
         endpoint_identifier: str | None = None,
-        headers: list[tuple[str, str]] | None = None,
+        headers: Sequence[tuple[str, str]] | None = None,
         llm_api_provider: str | None = None,
         timeout: float = 0.5,
         cache: bool = False,
@@ -154,8 +212,8 @@ class RuleProcessor(AlltrueAPIClient):
             timeout=timeout,
             cache=cache,
         )
-        if HttpStatus.is_success(response.status_code):
-            return response.json().get("sanctioned", True)
+        if _is_success(response.status_code):
+            return serialization.loads(response.content).get("sanctioned", True)
         else:
             return True
 
@@ -164,23 +222,25 @@ class RuleProcessor(AlltrueAPIClient):
         self,
         endpoint: str,
         method: HttpMethod = "POST",
-        body: dict | None = None,
+        body: dict | bytes | None = None,
         timeout: float | None = None,
         cache: bool = False,
+        revalidate: bool = False,
     ) -> httpx.Response:
         return await super()._request(
-            endpoint=f"/v1/llm-firewall/chat/{endpoint.removeprefix('/')}",
+            endpoint=_chat_path(endpoint),
             method=method,
             body=body,
             timeout=timeout,
             cache=cache,
+            revalidate=revalidate,
         )
 
     async def check_connection(
         self,
         endpoint_identifier: str,
         llm_api_provider: str | None = None,
-        headers: list[tuple[str, str]] | None = None,
+        headers: Sequence[tuple[str, str]] | None = None,
         timeout: float = 0.5,
         cache: bool = False,
         **kwargs,
@@ -188,18 +248,29 @@ class RuleProcessor(AlltrueAPIClient):
         """
         Check if the LLM endpoint is connectable
         """
+        if headers:
+            # sorted by name, so the same headers always serialize the same
+            sorted_headers = dict(sorted(headers, key=itemgetter(0)))
+            _headers = serialization.dumps(sorted_headers).decode("utf-8")
+        else:
+            _headers = _EMPTY_HEADERS
         reply = await self._chat(
-            endpoint=f"/check-connection/{llm_api_provider or self.config.llm_api_provider}",
+            endpoint=self._endpoint_for(
+                "check-connection", llm_api_provider or self.config.llm_api_provider
+            ),
             body={
                 "endpoint_identifier": endpoint_identifier,
-                "headers": json.dumps(dict(headers) if headers else {}),
+                "headers": _headers,
             },
             timeout=timeout,
             cache=cache,
+            revalidate=True,
         )
-        if not HttpStatus.is_success(reply.status_code):
+        if not _is_success(reply.status_code):
             self.log.warning(
-                f"Check failed: {reply.status_code}-{reply.text}",
+                "Check failed: %s-%s",
+                reply.status_code,
+                reply.text,
             )
             return False
         return True
@@ -212,15 +283,13 @@ class RuleProcessor(AlltrueAPIClient):
         endpoint_identifier: str,
         url: str = "https://httpbin.org",
         method: HttpMethod = "POST",
-        headers: list[tuple[str, str]] | None = None,
+        headers: Sequence[tuple[str, str]] | None = None,
         host: str | None = None,
         port: int | None = None,
         scheme: str | None = None,
         client_ip: str = "192.0.2.0",
         client_port: int = 0,
-        start_time: float = datetime.timestamp(
-            datetime.now(UTC)
-        ),  # unix timestamp of flow start
+        start_time: float | None = None,  # unix timestamp of flow start
         llm_api_provider: str | None = None,
         **kwargs,
     ) -> ProcessResult | None:
@@ -237,12 +306,15 @@ class RuleProcessor(AlltrueAPIClient):
         :param client_ip: Client IP address
         :param client_port: Client port
         :param endpoint_identifier: optional endpoint identifier
-        :param start_time
+        :param start_time: unix timestamp of flow start, defaults to now
         :param llm_api_provider
         :return: If we don't want to touch the request, return None. Else return a tuple: [new_body, status_code]
                  If we want to return 403 Forbidden, return ["forbidden", 403]
                  similarly, If we want to return a new body, return [new_body, 200]
         """
+        if start_time is None:
+            start_time = time.time()
+        url, host, port, scheme = _parse_url(url, scheme=scheme, host=host, port=port)
         api_req_body = {
             "original_request_body": body,
             "completion_request_id": request_id,
@@ -252,7 +324,10 @@ class RuleProcessor(AlltrueAPIClient):
             "client_port": client_port,
             "endpoint_identifier": endpoint_identifier,
             "start_time": start_time,
-            **_parse_url(url, scheme=scheme, host=host, port=port),
+            "url": url,
+            "host": host,
+            "port": port,
+            "scheme": scheme,
         }
 
         # for custom proxy deployments, the proxy type is included in the base URL the user calls. So if provided,
@@ -261,20 +336,22 @@ class RuleProcessor(AlltrueAPIClient):
 
         try:
             reply = await self._chat(
-                f"/process-input/{proxy_type}",
+                self._endpoint_for("process-input", proxy_type),
                 body=api_req_body,
             )
-            if not HttpStatus.is_success(reply.status_code):
+            if not _is_success(reply.status_code):
                 self.log.warning(
-                    f"Failed to call Control Plane input API: {reply.status_code}-{reply.text}",
+                    "Failed to call Control Plane input API: %s-%s",
+                    reply.status_code,
+                    reply.text,
                 )
                 return None
 
-            self.log.debug(f"Replied {reply.text}")
-            reply_body_json = json.loads(reply.text)
+            self.log.debug("Replied %s", reply.content[:256])
+            reply_body_json = serialization.loads(reply.content)
             body = reply_body_json["processed_input"]
             if isinstance(body, dict):
-                body = json.dumps(body)
+                body = serialization.dumps(body).decode("utf-8")
 
             return ProcessResult(
                 content=body,
@@ -287,6 +364,9 @@ class RuleProcessor(AlltrueAPIClient):
                 exc_info=e,
             )
             return None
+        except _NETWORK_ERRORS as e:
+            self.log.warning("Failed to reach Control Plane input API: %r", e)
+            return None
         except Exception as e:
             self.log.exception(
                 "Failed to call Control Plane input API",
@@ -302,17 +382,15 @@ class RuleProcessor(AlltrueAPIClient):
         request_id: str,
         endpoint_identifier: str,
         url: str = "https://httpbin.org",
-        request_headers: list[tuple[str, str]] | None = None,
-        response_headers: list[tuple[str, str]] | None = None,
+        request_headers: Sequence[tuple[str, str]] | None = None,
+        response_headers: Sequence[tuple[str, str]] | None = None,
         client_ip: str = "192.0.2.0",
         client_port: int = 0,
         host: str | None = None,
         method: HttpMethod = "POST",
         port: int | None = None,
         scheme: str | None = None,
-        start_time: float = datetime.timestamp(
-            datetime.now(UTC)
-        ),  # unix timestamp of flow start
+        start_time: float | None = None,  # unix timestamp of flow start
         llm_api_provider: str | None = None,
         **kwargs,
     ) -> ProcessResult | None:
@@ -331,13 +409,16 @@ class RuleProcessor(AlltrueAPIClient):
         :param client_ip: Client IP address
         :param client_port: Client port,
         :param endpoint_identifier: optional endpoint identifier
-        :param start_time
+        :param start_time: unix timestamp of flow start, defaults to now
         :param llm_api_provider
         :return: If we don't want to touch the request, return None. Else, return a tuple: [new_body, status_code]
                  If we want to return 403 Forbidden, return ["forbidden", 403]
                  similarly, If we want to return a new body, return [new_body, 200]
 
         """
+        if start_time is None:
+            start_time = time.time()
+        url, host, port, scheme = _parse_url(url, scheme=scheme, host=host, port=port)
         api_req_body = {
             "original_response_body": body,
             "original_request_body": original_request_input,
@@ -349,7 +430,10 @@ class RuleProcessor(AlltrueAPIClient):
             "endpoint_identifier": endpoint_identifier,
             "method": method,
             "start_time": start_time,
-            **_parse_url(url, scheme=scheme, host=host, port=port),
+            "url": url,
+            "host": host,
+            "port": port,
+            "scheme": scheme,
         }
 
         # for custom proxy deployments, the proxy type is included in the base URL the user calls. So if provided,
@@ -358,20 +442,22 @@ class RuleProcessor(AlltrueAPIClient):
 
         try:
             reply = await self._chat(
-                f"/process-output/{proxy_type}",
+                self._endpoint_for("process-output", proxy_type),
                 body=api_req_body,
             )
-            if reply.status_code < 200 or reply.status_code > 299:
+            if not _is_success(reply.status_code):
                 self.log.warning(
-                    f"Failed to call Control Plane output API: {reply.status_code}-{reply.text}",
+                    "Failed to call Control Plane output API: %s-%s",
+                    reply.status_code,
+                    reply.text,
                 )
                 return None
 
-            self.log.debug("Replied %s", reply.text)
-            reply_body_json = json.loads(reply.text)
+            self.log.debug("Replied %s", reply.content[:256])
+            reply_body_json = serialization.loads(reply.content)
             body = reply_body_json["processed_output"]
             if isinstance(body, dict):
-                body = json.dumps(body)
+                body = serialization.dumps(body).decode("utf-8")
             return ProcessResult(
                 content=body,
                 status_code=reply_body_json["status_code"],
@@ -383,6 +469,9 @@ class RuleProcessor(AlltrueAPIClient):
                 exc_info=e,
             )
             return None
+        except _NETWORK_ERRORS as e:
+            self.log.warning("Failed to reach Control Plane output API: %r", e)
+            return None
         except Exception as e:
             self.log.exception(
                 "Failed to call Control Plane output API",
@@ -407,14 +496,12 @@ class RuleProcessor(AlltrueAPIClient):
          2) usage - validate the usage of the endpoint and return forbidden result when unsanctioned
          3) None - default, no validation before the process of prompt
         """
-        headers = kwargs.pop(
-            "headers",
-            [
-                ("Content-Type", "application/json"),
-            ],
-        )
+        headers: Sequence[tuple[str, str]] | None = kwargs.pop("headers", None)
+        if headers is None:
+            headers = _DEFAULT_PROMPT_HEADERS
         if not quick_response:
-            headers.append(("x-alltrue-llm-cache-control", "no-cache"))
+            # copied, not to modify the given headers
+            headers = [*headers, ("x-alltrue-llm-cache-control", "no-cache")]
             kwargs["cache"] = False
         else:
             kwargs["cache"] = True
@@ -468,32 +555,28 @@ class RuleProcessor(AlltrueAPIClient):
             method="GET",
             cache=False,
         )
-        if HttpStatus.is_success(reply.status_code):
+        if _is_success(reply.status_code):
             try:
-                session = json.loads(reply.text)
+                session = serialization.loads(reply.content)
                 content = {
                     "id": request_id,
                     "llm_provider_name": session.get("llm_provider_name"),
                     "llm_model_name": session.get("llm_model_name"),
                 }
-                for req_type in ["input", "output"]:
-                    req = session.get(f"{req_type}_request")
+                for req_key, actions_key, process_key in _TRACE_KEYS:
+                    req = session.get(req_key)
                     if req:
-                        content.update(
-                            {
-                                f"{req_type}_process": {
-                                    "at": req.get("created_at"),
-                                    "actions": [
-                                        action.get("action_json")
-                                        for action in req.get(f"{req_type}_actions", [])
-                                    ],
-                                }
-                            }
-                        )
+                        content[process_key] = {
+                            "at": req.get("created_at"),
+                            "actions": [
+                                action.get("action_json")
+                                for action in req.get(actions_key) or ()
+                            ],
+                        }
 
                 return ProcessResult(
                     status_code=reply.status_code,
-                    content=json.dumps(content),
+                    content=serialization.dumps(content).decode("utf-8"),
                 )
             except (JSONDecodeError, KeyError) as e:
                 self.log.exception(
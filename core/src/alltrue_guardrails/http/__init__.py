@@ -47,4 +47,4 @@ class HttpStatus(IntEnum):
 
     @classmethod
     def is_unauthorized(cls, value: int) -> bool:
-        return value in [httpx.codes.UNAUTHORIZED, httpx.codes.FORBIDDEN]
+        return value == httpx.codes.UNAUTHORIZED or value == httpx.codes.FORBIDDEN
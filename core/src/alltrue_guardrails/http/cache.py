@@ -13,7 +13,11 @@
 #  limitations under the License.
 #
 
+import asyncio
+import functools
 import logging
+import socket
+import weakref
 from hashlib import blake2b
 from typing import Callable, NamedTuple
 
@@ -25,21 +29,63 @@ from typing_extensions import override
 from ..utils.config import get_or_default
 from . import HttpMethod
 
+# pool sized for concurrent control plane calls, e.g. batches along with token requests;
+# idle connections are kept long enough to outlive common proxy idle timeouts
+DEFAULT_POOL_LIMITS = httpx.Limits(
+    max_connections=1000,
+    max_keepalive_connections=100,
+    keepalive_expiry=15.0,
+)
+
+# request extension to reuse a cached response only while fresh, revalidating it otherwise;
+# responses without validators to revalidate with are reused until expired from the cache instead
+REVALIDATE_EXTENSION = "alltrue_revalidate"
+# response headers a stale cached response can be revalidated with
+_VALIDATOR_HEADERS = (b"etag", b"last-modified")
+
+
+@functools.lru_cache(maxsize=16)
+def _parse_timeout(value: str) -> float | None:
+    value = value.lower()
+    if value == "none":
+        return -1
+    elif value == "default":
+        return None
+    return float(value)
+
+
+@functools.lru_cache(maxsize=16)
+def _parse_keep_alive(value: str) -> bool:
+    return value.lower() not in ["none", "no", "disabled", "0", "false"]
+
+
+def _resolve_timeout(timeout: float | None = None) -> float | None:
+    """
+    Timeout in seconds, falling back to CONFIG_HTTP_TIMEOUT when not given; None for httpx default
+    """
+    if timeout is None:
+        return _parse_timeout(
+            get_or_default("HTTP_TIMEOUT", prefix="CONFIG", default="default")
+        )
+    return timeout
+
+
+def _resolve_keep_alive(keep_alive: bool | None = None) -> bool:
+    """
+    Whether to keep connections alive, falling back to CONFIG_HTTP_KEEPALIVE when not given
+    """
+    if keep_alive is None:
+        return _parse_keep_alive(
+            get_or_default(name="HTTP_KEEPALIVE", prefix="CONFIG", default="default")
+        )
+    return _parse_keep_alive(str(keep_alive))
+
 
 def _get_http_timeout_config(
     logger: logging.Logger,
     timeout: float | None = None,
 ) -> httpx.Timeout:
-    if timeout is None:
-        timeout_value = get_or_default(
-            "HTTP_TIMEOUT", prefix="CONFIG", default="default"
-        ).lower()
-        if timeout_value == "none":
-            timeout = -1
-        elif timeout_value == "default":
-            logging.debug("HTTP_TIMEOUT is set to default, using default timeout")
-        else:
-            timeout = float(timeout_value)
+    timeout = _resolve_timeout(timeout)
 
     # Convert the timeout value to the appropriate format
     if timeout is None:
@@ -49,7 +95,7 @@ def _get_http_timeout_config(
         logger.info("HTTP timeout disabled")
         httpx_timeout = httpx.Timeout(None)  # No timeout
     else:
-        logger.info(f"HTTP Timeout set to {timeout}s")
+        logger.info("HTTP Timeout set to %ss", timeout)
         httpx_timeout = httpx.Timeout(timeout)  # Custom timeout in seconds
     return httpx_timeout
 
@@ -59,18 +105,9 @@ def _get_http_transport_config(
     verify: bool = True,
     keep_alive: bool | None = None,
     retries: int = 0,
+    limits: httpx.Limits = DEFAULT_POOL_LIMITS,
 ) -> httpx.AsyncHTTPTransport | None:
-    if keep_alive is None:
-        keepalive_value = (
-            keep_alive
-            or get_or_default(
-                name="HTTP_KEEPALIVE", prefix="CONFIG", default="default"
-            ).lower()
-        )
-    else:
-        keepalive_value = str(keep_alive).lower()
-
-    if keepalive_value in ["none", "no", "disabled", "0", "false"]:
+    if not _resolve_keep_alive(keep_alive):
         # do not keep alive and reopen connection on every request to prevent event loop closed error
         # which is very likely to happen on pytesting async code
         # see https://github.com/encode/httpx/discussions/2959#discussioncomment-7665278
@@ -78,21 +115,32 @@ def _get_http_transport_config(
         return httpx.AsyncHTTPTransport(
             verify=verify,
             limits=httpx.Limits(
-                max_connections=100,
+                max_connections=limits.max_connections,
                 max_keepalive_connections=0,
             ),
             retries=retries,
         )
     else:
-        # use default keep alive settings
+        # keep connections alive in the pool, with HTTP/2 to multiplex concurrent requests
+        # over the same connection and TCP keep-alive probes so idle pooled connections
+        # are not silently dropped
         logger.debug("HTTP keep-alive is set to default")
-        return None
+        return httpx.AsyncHTTPTransport(
+            verify=verify,
+            http2=True,
+            socket_options=[(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)],
+            limits=limits,
+            retries=retries,
+        )
 
 
 class CachableEndpoint(NamedTuple):
     path: str
     methods: list[HttpMethod]
     key_generator: Callable[[Request, bytes], bytes] = lambda r, b: b
+    # utf-8 encoded path and methods, filled in on registration
+    path_bytes: bytes = b""
+    method_bytes: frozenset[bytes] = frozenset()
 
 
 class PathBasedCacheController(hishel.Controller):
@@ -103,47 +151,77 @@ class PathBasedCacheController(hishel.Controller):
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
-        self._registries = registries or []
+        self._registries: list[CachableEndpoint] = []
+        for registry in registries or []:
+            self._add(registry)
         self._default_key_generator = self._key_generator  # type: ignore
         self._key_generator = self._generate_key
 
-    def _generate_key(self, request: Request, body: bytes = b"") -> str:
+    @staticmethod
+    def _prepare(cachable: CachableEndpoint) -> CachableEndpoint:
+        return cachable._replace(
+            path_bytes=cachable.path.encode("utf-8"),
+            method_bytes=frozenset(m.encode("ascii") for m in cachable.methods),
+        )
+
+    def _add(self, cachable: CachableEndpoint) -> None:
+        self._registries.append(self._prepare(cachable))
+        # longest prefix first, so the most specific registry is matched
+        self._registries.sort(key=lambda r: len(r.path_bytes), reverse=True)
+
+    def _match(self, target: bytes) -> CachableEndpoint | None:
         for registry in self._registries:
-            if request.url.target.startswith(registry.path.encode("utf-8")):
-                key = blake2b(digest_size=16, usedforsecurity=False)
-                key.update(registry.path.encode("utf-8"))
-                key.update(request.method)
-                key.update(registry.key_generator(request, body))
-                return key.hexdigest()
+            if target.startswith(registry.path_bytes):
+                return registry
+        return None
+
+    def _generate_key(self, request: Request, body: bytes = b"") -> str:
+        registry = self._match(request.url.target)
+        if registry is not None:
+            return blake2b(
+                b"".join(
+                    (
+                        registry.path_bytes,
+                        request.method,
+                        registry.key_generator(request, body),
+                    )
+                ),
+                digest_size=16,
+                usedforsecurity=False,
+            ).hexdigest()
         return self._default_key_generator(request, body)
 
     @override  # type: ignore
     def is_cachable(self, request: Request, response: Response) -> bool:
-        matched = False
-        if len(self._registries) > 0:
-            _path = request.url.target
-            _method = request.method.decode("utf-8")
-            for registry in self._registries:
-                if (
-                    _path.startswith(registry.path.encode("utf-8"))
-                    and _method in registry.methods
-                ):
-                    return True
-        return matched or super().is_cachable(request, response)
+        registry = self._match(request.url.target)
+        if registry is not None and request.method in registry.method_bytes:
+            return True
+        return super().is_cachable(request, response)
+
+    @override  # type: ignore
+    def construct_response_from_cache(
+        self, request: Request, response: Response, original_request: Request
+    ) -> Response | Request | None:
+        if request.extensions.get(REVALIDATE_EXTENSION) and not any(
+            name.lower() in _VALIDATOR_HEADERS for name, _ in response.headers
+        ):
+            # nothing to revalidate with, served as forced until expired by the cache TTL
+            return response
+        return super().construct_response_from_cache(
+            request, response, original_request
+        )
 
     def is_registered(self, endpoint: str) -> bool:
         return any(
-            [
-                endpoint.startswith(reg.path) or reg.path.startswith(endpoint)
-                for reg in self._registries
-            ]
+            endpoint.startswith(reg.path) or reg.path.startswith(endpoint)
+            for reg in self._registries
         )
 
     def register_cachable(
         self, cachable: CachableEndpoint, update: bool = False
     ) -> None:
         if not self.is_registered(cachable.path):
-            self._registries.append(cachable)
+            self._add(cachable)
         elif update:
             # update registered with the given one
             for registry in self._registries:
@@ -151,7 +229,7 @@ class PathBasedCacheController(hishel.Controller):
                     cachable.path
                 ):
                     self._registries.remove(registry)
-                    self._registries.append(
+                    self._add(
                         CachableEndpoint(
                             path=min(cachable.path, registry.path),
                             methods=list({*cachable.methods, *registry.methods}),
@@ -176,6 +254,7 @@ class CachableHttpClient(httpx.AsyncClient):
         cache_ttl: int = 600,
         cache_capacity: int = 32,
         keep_alive: bool | None = None,
+        limits: httpx.Limits = DEFAULT_POOL_LIMITS,
     ):
         """
         :param base_url: base url to make requests against
@@ -184,6 +263,8 @@ class CachableHttpClient(httpx.AsyncClient):
         :param retries: HTTP request retries; set to 0 to disable.
         :param cache_ttl: HTTP request cache TTL; set to None to disable.
         :param cache_capacity: HTTP request cache capacity; set to 0 to disable.
+        :param keep_alive: whether to keep connections alive; loading from config `CONFIG_HTTP_KEEPALIVE` if not specified.
+        :param limits: connection pool limits
         """
         self._controller = PathBasedCacheController()
         super().__init__(
@@ -195,6 +276,7 @@ class CachableHttpClient(httpx.AsyncClient):
                     verify=verify,
                     keep_alive=keep_alive,
                     retries=retries or 0,
+                    limits=limits,
                 )
                 or httpx.AsyncHTTPTransport(verify=verify),
                 storage=hishel.AsyncInMemoryStorage(
@@ -207,3 +289,60 @@ class CachableHttpClient(httpx.AsyncClient):
 
     def register_cachable(self, cachable: CachableEndpoint):
         self._controller.register_cachable(cachable)
+
+
+# clients are released once no API client holds on to them anymore
+_SHARED_CLIENTS: "weakref.WeakValueDictionary[tuple, CachableHttpClient]" = (
+    weakref.WeakValueDictionary()
+)
+
+
+def get_shared_client(
+    base_url: str,
+    api_key: str | None = None,
+    logger: logging.Logger = logging.getLogger("alltrue.http"),
+    verify: bool = True,
+    timeout: float | None = 1.0,
+    retries: int | None = None,
+    keep_alive: bool | None = None,
+) -> CachableHttpClient:
+    """
+    Get the client shared for the given settings on the running event loop, creating it when none is in use,
+    so that connection pool and cache are shared among API clients.
+
+    Connection pools are bound to the event loop they were opened on, so without a running loop
+    a client of its own is returned instead.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+
+    def _create() -> CachableHttpClient:
+        return CachableHttpClient(
+            base_url=base_url,
+            logger=logger,
+            verify=verify,
+            timeout=timeout,
+            retries=retries,
+            keep_alive=keep_alive,
+        )
+
+    if loop is None:
+        return _create()
+
+    # key on the loop, the credentials (the cache is shared along) and the effective settings,
+    # so changed environment configs get their own client
+    key = (
+        loop,
+        base_url,
+        api_key,
+        verify,
+        _resolve_timeout(timeout),
+        retries,
+        _resolve_keep_alive(keep_alive),
+    )
+    client = _SHARED_CLIENTS.get(key)
+    if client is None or client.is_closed:
+        client = _SHARED_CLIENTS[key] = _create()
+    return client
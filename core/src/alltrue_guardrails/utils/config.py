@@ -16,10 +16,14 @@
 import os
 
 from dotenv import load_dotenv
-from pydantic import BaseModel, BeforeValidator
-from typing_extensions import Annotated
 
-load_dotenv()
+# deployments configured by environment only can skip looking up and parsing a .env file,
+# or point to the file to load it without searching the directory tree for one
+if os.environ.get("ALLTRUE_DISABLE_DOTENV", "").lower() in ["", "0", "false", "no"]:
+    load_dotenv(dotenv_path=os.environ.get("ALLTRUE_DOTENV_PATH"), override=False)
+
+# configured provider names known to the control plane by another name
+_PROVIDER_ALIASES = {"gemini": "google"}
 
 
 def get_or_default(name: str, prefix: str | None = None, default: str | None = None):
@@ -48,16 +52,44 @@ def _get_api_key():
 
 def _get_api_provider():
     _provider = get_or_default(name="LLM_API_PROVIDER", prefix="CONFIG", default=None)
-    match _provider or get_value(name="proxy_type", prefix="CONFIG"):
-        case "gemini":
-            return "google"
-        case others:
-            return others
-
-
-class AlltrueConfig(BaseModel):
-    api_url: Annotated[str | None, BeforeValidator(lambda a: a or _get_api_url())]
-    api_key: Annotated[str | None, BeforeValidator(lambda a: a or _get_api_key())]
-    llm_api_provider: Annotated[
-        str | None, BeforeValidator(lambda a: a or _get_api_provider())
-    ]
+    _provider = _provider or get_value(name="proxy_type", prefix="CONFIG")
+    return _PROVIDER_ALIASES.get(_provider, _provider)
+
+
+class AlltrueConfig:
+    """
+    Settings to access Alltrue APIs, falling back to the environment configs when not given;
+    the fallbacks are looked up on first access, so settings never used are never required
+    """
+
+    __slots__ = ("_api_url", "_api_key", "_llm_api_provider")
+
+    def __init__(
+        self,
+        api_url: str | None = None,
+        api_key: str | None = None,
+        llm_api_provider: str | None = None,
+        **kwargs,
+    ):
+        # other settings are not used by the config and ignored
+        self._api_url = api_url or None
+        self._api_key = api_key or None
+        self._llm_api_provider = llm_api_provider or None
+
+    @property
+    def api_url(self) -> str:
+        if self._api_url is None:
+            self._api_url = _get_api_url()
+        return self._api_url  # type: ignore
+
+    @property
+    def api_key(self) -> str:
+        if self._api_key is None:
+            self._api_key = _get_api_key()
+        return self._api_key
+
+    @property
+    def llm_api_provider(self) -> str:
+        if self._llm_api_provider is None:
+            self._llm_api_provider = _get_api_provider()
+        return self._llm_api_provider
@@ -15,10 +15,21 @@
 
 import importlib.util
 import logging
+import os
+import re
 import time
 from contextlib import contextmanager
 from typing import Any
 
+# span details and elapsed time of instrumented calls, rewritten into the "| " separated format
+_LOGFIRE_MSG_RE = re.compile(
+    r"(\s+\([\w\{\}\s\=\(\),\"\:\[\]\'\-\#\.\/\<\>\\\?\*\%]+\s+)(\d+\.\d+s)?\s+\|"
+)
+
+
+def _noop(*args, **kwargs) -> None:
+    return None
+
 
 class LogfireMock:
     """Mock version of logfire that preserves function behavior when used as a decorator (logfire.instrument),
@@ -27,14 +38,10 @@ class LogfireMock:
     def __init__(self):
         self.log = logging.getLogger("logfire")
         if not getattr(self.log, "_patched", False):
-            import re
-
-            _p = r"(\s+\([\w\{\}\s\=\(\),\"\:\[\]\'\-\#\.\/\<\>\\\?\*\%]+\s+)(\d+\.\d+s)?\s+\|"
-            _r = r" | \2"
             _log = self.log.log
             self.log.log = lambda lv, msg, *args, **kwargs: _log(
                 lv,
-                f"{re.sub(_p, _r, msg)}".replace("<>|", "<> | "),
+                _LOGFIRE_MSG_RE.sub(r" | \2", msg).replace("<>|", "<> | "),
                 *args,
                 **kwargs,
             )
@@ -63,12 +70,33 @@ class LogfireMock:
 
     def __getattr__(self, name):
         """Return a no-op function for any other logfire methods."""
-        if hasattr(self.log, name):
-            return getattr(self.log, name)
-        return lambda *args, **kwargs: None
+        attr = getattr(self.log, name, _noop)
+        # kept on the instance, so later lookups no longer get here
+        setattr(self, name, attr)
+        return attr
 
 
-_LOGFIRE = None
+class LogfireNoop(LogfireMock):
+    """Stand-in of logfire doing nothing at all, so instrumented functions are left as is"""
+
+    def __init__(self):
+        self.log = logging.getLogger("logfire")
+
+    def instrument(self, *args0, **kwargs0):
+        return lambda func: func
+
+    @contextmanager
+    def span(self, *args, **kwargs):
+        yield None
+
+    def __getattr__(self, name):
+        setattr(self, name, _noop)
+        return _noop
+
+
+_LOGFIRE: Any = None
+# logfire is optional, looked up once instead of on every configuration
+_HAS_LOGFIRE = importlib.util.find_spec("logfire") is not None
 
 
 def configure_logfire(force: bool = False, **kwargs) -> Any:
@@ -76,15 +104,26 @@ def configure_logfire(force: bool = False, **kwargs) -> Any:
     Configure logfire for logging.
     Logfire is an optional dependency which may not be installed, in which case we mock it to prevent errors.
 
+    Set `ALLTRUE_DISABLE_LOGFIRE` to disable logfire, along with the instrumentation otherwise mocked.
+
     :param force: by default, configurations only set at the first time, giving this parameter as True to force setting logfire configurations.
     """
     global _LOGFIRE
+    # checked first, so forcing configurations does not get around disabling logfire
+    disabled = os.environ.get("ALLTRUE_DISABLE_LOGFIRE", "").lower()
+    if disabled not in ["", "0", "false", "no"]:
+        if not isinstance(_LOGFIRE, LogfireNoop):
+            _LOGFIRE = LogfireNoop()
+
+            logging.getLogger("logfire").info("Logfire and instrumentation disabled")
+        return _LOGFIRE
+
     if _LOGFIRE is not None:
         if force:
             _configure(**kwargs)
         return _LOGFIRE
 
-    if importlib.util.find_spec("logfire") is not None:
+    if _HAS_LOGFIRE:
         import logfire
 
         _configure(**kwargs)
@@ -104,7 +143,7 @@ def configure_logfire(force: bool = False, **kwargs) -> Any:
 
 
 def _configure(**kwargs):
-    if importlib.util.find_spec("logfire") is not None:
+    if _HAS_LOGFIRE:
         import logfire
 
         logfire.configure(
@@ -15,13 +15,14 @@
 
 import asyncio
 import json
+import logging
 import re
 import time
 import uuid
 
 import httpx
 import pytest
-from alltrue_guardrails.control.batch import BatchRuleProcessor
+from alltrue_guardrails.control.batch import BatchRuleProcessor, _BatchCaller
 from alltrue_guardrails.http import HttpStatus
 
 
@@ -101,3 +102,263 @@ async def test_batch_input_process(httpx_mock):
 
     # clean up
     await processor.close()
+
+
+def _batch_caller(calls: list, **kwargs) -> _BatchCaller:
+    async def _func(endpoint, method, body, timeout, cache) -> httpx.Response:
+        calls.append(json.loads(body)["requests"])
+        return httpx.Response(status_code=HttpStatus.OK)
+
+    return _BatchCaller(
+        func=_func,
+        endpoint="/process-input/any",
+        method="POST",
+        logger=logging.getLogger("alltrue.test"),
+        **kwargs,
+    )
+
+
+@pytest.mark.asyncio
+async def test_batch_caller_batch_size():
+    calls: list = []
+    caller = _batch_caller(calls, max_batch_size=2, max_queue_time=0.1)
+    await asyncio.gather(*[caller.process({"id": i}) for i in range(5)])
+    assert [len(batch) for batch in calls] == [2, 2, 1]
+    await caller.stop()
+
+
+@pytest.mark.asyncio
+async def test_batch_caller_deadline_flush():
+    calls: list = []
+    caller = _batch_caller(calls, max_batch_size=10, max_queue_time=0.05)
+    await asyncio.wait_for(caller.process({"id": 0}), timeout=1)
+    assert calls == [[{"id": 0}]]
+    await caller.stop()
+
+
+@pytest.mark.asyncio
+async def test_batch_caller_staggered_arrivals():
+    calls: list = []
+    caller = _batch_caller(calls, max_batch_size=10, max_queue_time=0.3, concurrency=3)
+
+    async def _arrive(i: int) -> None:
+        await asyncio.sleep(i * 0.01)
+        await caller.process({"id": i})
+
+    await asyncio.gather(*[_arrive(i) for i in range(10)])
+    # collected into a single batch, not split across concurrent senders
+    assert calls == [[{"id": i} for i in range(10)]]
+    await caller.stop()
+
+
+@pytest.mark.asyncio
+async def test_batch_caller_concurrent_senders():
+    started: list[int] = []
+    release = asyncio.Event()
+
+    async def _func(endpoint, method, body, timeout, cache) -> httpx.Response:
+        started.append(len(json.loads(body)["requests"]))
+        await release.wait()
+        return httpx.Response(status_code=HttpStatus.OK)
+
+    caller = _BatchCaller(
+        func=_func,
+        endpoint="/process-input/any",
+        method="POST",
+        logger=logging.getLogger("alltrue.test"),
+        max_batch_size=1,
+        max_queue_time=0,
+        concurrency=2,
+    )
+    tasks = [asyncio.ensure_future(caller.process({"id": i})) for i in range(3)]
+    await asyncio.sleep(0.05)
+    # no more batches in flight than senders allowed
+    assert started == [1, 1]
+    release.set()
+    await asyncio.wait_for(asyncio.gather(*tasks), timeout=1)
+    assert started == [1, 1, 1]
+    await caller.stop()
+
+
+@pytest.mark.asyncio
+async def test_batch_caller_stop():
+    calls: list = []
+    caller = _batch_caller(calls, max_batch_size=10, max_queue_time=0.05)
+    task = asyncio.ensure_future(caller.process({"id": 0}))
+    await asyncio.sleep(0)
+    # queued bodies are handled before the workers stop
+    await caller.stop()
+    await asyncio.wait_for(task, timeout=1)
+    assert calls == [[{"id": 0}]]
+    assert not await caller.is_running()
+
+
+@pytest.mark.asyncio
+async def test_batch_caller_restart_collector():
+    calls: list = []
+    caller = _batch_caller(calls, max_queue_time=0.01)
+    await caller.process({"id": 0})
+    assert caller._collector is not None
+    caller._collector.cancel()
+    await asyncio.gather(caller._collector, return_exceptions=True)
+
+    await asyncio.wait_for(caller.process({"id": 1}), timeout=1)
+    assert calls == [[{"id": 0}], [{"id": 1}]]
+    await caller.stop()
+
+
+@pytest.mark.asyncio
+async def test_batch_caller_stop_without_collector():
+    calls: list = []
+    caller = _batch_caller(calls, max_queue_time=0.01)
+    await caller.process({"id": 0})
+    assert caller._collector is not None
+    caller._collector.cancel()
+    await asyncio.gather(caller._collector, return_exceptions=True)
+    done = asyncio.get_running_loop().create_future()
+    caller._queue.put_nowait(({"id": 1}, done))
+
+    # returns rather than waiting on a queue nothing drains, failing what was left
+    await asyncio.wait_for(caller.stop(), timeout=1)
+    with pytest.raises(RuntimeError):
+        await done
+
+
+@pytest.mark.asyncio
+async def test_batch_caller_propagate_errors():
+    caller = _batch_caller([], max_queue_time=0.01)
+
+    async def _fail(batch):
+        raise ValueError("failed")
+
+    caller.process_batch = _fail  # type: ignore
+    with pytest.raises(ValueError):
+        await asyncio.wait_for(caller.process({"id": 0}), timeout=1)
+    # the worker keeps serving
+    with pytest.raises(ValueError):
+        await asyncio.wait_for(caller.process({"id": 1}), timeout=1)
+    await caller.stop()
+
+
+@pytest.mark.httpx_mock(can_send_already_matched_responses=True)
+@pytest.mark.asyncio
+async def test_batch_serialized_body(httpx_mock):
+    def _response(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("jwt-token"):
+            return httpx.Response(status_code=200, json={"access_token": "token"})
+        return httpx.Response(status_code=200, json={})
+
+    httpx_mock.add_callback(_response)
+
+    processor = BatchRuleProcessor(
+        api_url="http://localhost:8080",
+        api_key="dummy-api-key",
+        llm_api_provider="any",
+        queue_time=0.05,
+    )
+    body = {"original_request_body": json.dumps({"message": "content"})}
+    reply = await processor._chat(
+        "/process-input/any", body=json.dumps(body).encode("utf-8")
+    )
+    assert json.loads(reply.content)["processed_input"] == {"message": "content"}
+    batched = httpx_mock.get_request(url=re.compile(r".*/batch/process-input/any"))
+    assert json.loads(batched.content) == {"requests": [body]}
+
+    await processor.close()
+
+
+@pytest.mark.httpx_mock(can_send_already_matched_responses=True)
+@pytest.mark.asyncio
+async def test_batch_per_endpoint(httpx_mock):
+    def _response(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("jwt-token"):
+            return httpx.Response(status_code=200, json={"access_token": "token"})
+        return httpx.Response(status_code=200, json={})
+
+    httpx_mock.add_callback(_response)
+
+    processor = BatchRuleProcessor(
+        api_url="http://localhost:8080",
+        api_key="dummy-api-key",
+        batch_size=2,
+        queue_time=0.05,
+    )
+    results = await asyncio.gather(
+        *[
+            processor.process_request(
+                body=json.dumps({"provider": provider}),
+                request_id=str(uuid.uuid4()),
+                endpoint_identifier="dummy-endpoint-identifier",
+                llm_api_provider=provider,
+            )
+            for provider in ["a", "a", "a", "b"]
+        ]
+    )
+    assert all(result.status_code == HttpStatus.OK for result in results)
+
+    batches: dict[str, list[list[str]]] = {}
+    for request in httpx_mock.get_requests(url=re.compile(r".*/batch/.*")):
+        batches.setdefault(request.url.path, []).append(
+            [
+                json.loads(body["original_request_body"])["provider"]
+                for body in json.loads(request.content)["requests"]
+            ]
+        )
+    # separate batches per endpoint, the full one flushed at once, the rest by the deadline
+    assert sorted(batches["/v1/llm-firewall/chat/batch/process-input/a"]) == [
+        ["a"],
+        ["a", "a"],
+    ]
+    assert batches["/v1/llm-firewall/chat/batch/process-input/b"] == [["b"]]
+
+    await processor.close()
+
+
+@pytest.mark.asyncio
+async def test_close_timeout():
+    processor = BatchRuleProcessor(
+        api_url="http://localhost:8080",
+        api_key="dummy-api-key",
+        llm_api_provider="any",
+    )
+
+    async def _stall(*args) -> httpx.Response:
+        await asyncio.Event().wait()
+        return httpx.Response(status_code=HttpStatus.OK)
+
+    caller = _BatchCaller(
+        func=_stall,
+        endpoint="/process-input/any",
+        method="POST",
+        logger=logging.getLogger("alltrue.test"),
+        max_queue_time=0,
+    )
+    processor._batchers[("POST", "/process-input/any")] = caller
+    task = asyncio.ensure_future(caller.process({"id": 0}))
+    await asyncio.sleep(0.01)
+
+    await processor.close(timeout=0.05)
+    assert not await caller.is_running()
+    with pytest.raises(RuntimeError):
+        await asyncio.wait_for(task, timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_close_failure():
+    processor = BatchRuleProcessor(
+        api_url="http://localhost:8080",
+        api_key="dummy-api-key",
+        llm_api_provider="any",
+    )
+    caller = _batch_caller([], max_queue_time=0.01)
+    await caller.process({"id": 0})
+
+    async def _fail():
+        raise ValueError("failed")
+
+    caller.stop = _fail  # type: ignore
+    processor._batchers[("POST", "/process-input/any")] = caller
+
+    # failures are logged, and the workers still stopped
+    await processor.close()
+    assert not await caller.is_running()
@@ -0,0 +1,188 @@
+#  Copyright 2025 AllTrue.ai Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import asyncio
+import json
+
+import httpcore
+import httpx
+import pytest
+from alltrue_guardrails.control.chat import (
+    RuleProcessor,
+    _gen_cache_key,
+    _parse_url,
+)
+from alltrue_guardrails.http import HttpStatus
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        (
+            "https://httpbin.org/get/abc/123",
+            ("httpbin.org", 443, "https"),
+        ),
+        (
+            "http://localhost:8080/v1",
+            ("localhost", 8080, "http"),
+        ),
+    ],
+)
+def test_parse_url(url, expected):
+    assert _parse_url(url) == (url, *expected)
+    assert _parse_url(url, host="example.com", port=80)[1:3] == ("example.com", 80)
+
+
+@pytest.mark.parametrize(
+    "body, expected",
+    [
+        ({"endpoint_identifier": "abc", "headers": "{}"}, b"abc"),
+        ({"headers": json.dumps({"Authorization": "Bearer key"})}, b"Bearer key"),
+        (
+            {"llm_api_request": {"request_headers": {"x-api-key": "key"}}},
+            b"key",
+        ),
+        ({"headers": json.dumps({"X-Api-Key": "key"})}, b"key"),
+        (
+            {"llm_api_request": {"request_headers": {"AUTHORIZATION": "key"}}},
+            b"key",
+        ),
+        # escaped values are read from the parsed body
+        ({"endpoint_identifier": 'a"b'}, b'a"b'),
+        (
+            {"endpoint_identifier": None, "headers": json.dumps({"x-key": 'k"'})},
+            b'k"',
+        ),
+    ],
+)
+def test_gen_cache_key(body, expected):
+    request = httpcore.Request(method="POST", url="https://example.com")
+    assert _gen_cache_key(request, json.dumps(body).encode("utf-8")) == expected
+
+
+def test_gen_cache_key_fallback():
+    request = httpcore.Request(method="POST", url="https://example.com")
+    for body in [b"", b"not-json", b'{"headers": "{}"}']:
+        assert _gen_cache_key(request, body) == body
+
+
+@pytest.mark.httpx_mock(can_send_already_matched_responses=True)
+def test_processors_on_separate_loops(httpx_mock):
+    def _response(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("jwt-token"):
+            return httpx.Response(status_code=200, json={"access_token": "token"})
+        return httpx.Response(
+            status_code=200,
+            json={"status_code": 200, "processed_input": "{}"},
+        )
+
+    httpx_mock.add_callback(_response)
+
+    async def _process():
+        processor = RuleProcessor(
+            api_url="https://example.com",
+            api_key="key",
+            llm_api_provider="any",
+        )
+        return await processor.process_request(
+            body="{}",
+            request_id="request-id",
+            endpoint_identifier="endpoint-identifier",
+        )
+
+    # independent processors, each on an event loop of its own
+    for _ in range(2):
+        result = asyncio.run(_process())
+        assert result is not None and result.status_code == 200
+
+
+@pytest.mark.httpx_mock(can_send_already_matched_responses=True)
+@pytest.mark.parametrize(
+    "headers, expected",
+    [
+        (None, [["Content-Type", "application/json"]]),
+        ([], []),
+        ([("x-key", "key")], [["x-key", "key"]]),
+    ],
+)
+@pytest.mark.asyncio
+async def test_process_prompt_headers(httpx_mock, headers, expected):
+    def _response(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("jwt-token"):
+            return httpx.Response(status_code=200, json={"access_token": "token"})
+        assert json.loads(request.content)["headers"] == expected
+        return httpx.Response(
+            status_code=200,
+            json={"status_code": 200, "processed_input": "{}"},
+        )
+
+    httpx_mock.add_callback(_response)
+
+    processor = RuleProcessor(
+        api_url="https://example.com",
+        api_key="key",
+        llm_api_provider="any",
+    )
+    result = await processor.process_prompt(
+        request_id="request-id",
+        endpoint_identifier="endpoint-identifier",
+        prompt_input="{}",
+        headers=headers,
+    )
+    assert result is not None and result.status_code == 200
+
+
+@pytest.mark.httpx_mock(can_send_already_matched_responses=True)
+@pytest.mark.asyncio
+async def test_process_prompt_usage_per_credentials(httpx_mock):
+    def _response(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("jwt-token"):
+            return httpx.Response(status_code=200, json={"access_token": "token"})
+        elif request.url.path.endswith("llm-endpoint"):
+            headers = json.loads(request.content)["llm_api_request"]["request_headers"]
+            return httpx.Response(
+                status_code=200,
+                json={"sanctioned": headers["x-api-key"] == "sanctioned"},
+            )
+        return httpx.Response(
+            status_code=200,
+            json={"status_code": 200, "processed_input": "{}"},
+        )
+
+    httpx_mock.add_callback(_response)
+
+    processor = RuleProcessor(
+        api_url="https://example.com",
+        api_key="key",
+        llm_api_provider="any",
+    )
+
+    async def _process(api_key: str):
+        return await processor.process_prompt(
+            request_id="request-id",
+            endpoint_identifier="",
+            prompt_input="{}",
+            validation="usage",
+            headers=[("x-api-key", api_key)],
+        )
+
+    # validations are told apart by credentials
+    for api_key, expected in [
+        ("sanctioned", HttpStatus.OK),
+        ("unsanctioned", HttpStatus.FORBIDDEN),
+        ("sanctioned", HttpStatus.OK),
+    ]:
+        result = await _process(api_key)
+        assert result is not None and result.status_code == expected
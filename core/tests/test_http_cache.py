@@ -13,11 +13,19 @@
 #  limitations under the License.
 #
 
+import asyncio
 import time
 
+import httpcore
 import httpx
 import pytest
-from alltrue_guardrails.http.cache import CachableEndpoint, CachableHttpClient
+from alltrue_guardrails.http.cache import (
+    REVALIDATE_EXTENSION,
+    CachableEndpoint,
+    CachableHttpClient,
+    PathBasedCacheController,
+    get_shared_client,
+)
 
 
 @pytest.mark.asyncio
@@ -54,3 +62,102 @@ async def test_cache_result(httpx_mock):
     )
     assert resp2.status_code == 200
     assert resp2.json().get("time", 0) == resp1.json().get("time", 0)
+
+
+@pytest.mark.httpx_mock(can_send_already_matched_responses=True)
+@pytest.mark.parametrize(
+    "etag, expected_calls",
+    [
+        # nothing to revalidate with, reused until expired
+        (None, 1),
+        # revalidated with the server every time
+        ('"v1"', 3),
+    ],
+)
+@pytest.mark.asyncio
+async def test_cache_revalidate(httpx_mock, etag, expected_calls):
+    def _response(request: httpx.Request) -> httpx.Response:
+        headers = {"etag": etag} if etag else {}
+        if etag and request.headers.get("if-none-match") == etag:
+            return httpx.Response(status_code=304, headers=headers)
+        return httpx.Response(
+            status_code=200,
+            json={"time": time.time()},
+            headers=headers,
+        )
+
+    httpx_mock.add_callback(_response)
+
+    client = CachableHttpClient(
+        base_url="https://example.com",
+        verify=False,
+    )
+    client.register_cachable(
+        CachableEndpoint(
+            path="/v1/endpoint",
+            methods=["POST"],
+        )
+    )
+    responses = [
+        await client.post(
+            url="/v1/endpoint",
+            json={},
+            extensions={REVALIDATE_EXTENSION: True},
+        )
+        for _ in range(3)
+    ]
+    assert len(httpx_mock.get_requests()) == expected_calls
+    assert len({response.json()["time"] for response in responses}) == 1
+
+
+@pytest.mark.asyncio
+async def test_shared_client():
+    client = get_shared_client(base_url="https://example.com")
+    assert client is get_shared_client(base_url="https://example.com")
+    assert client is not get_shared_client(base_url="https://example.org")
+    assert client is not get_shared_client(base_url="https://example.com", timeout=2)
+    assert client is not get_shared_client(
+        base_url="https://example.com", api_key="other-key"
+    )
+
+
+def test_shared_client_per_loop():
+    async def _client() -> CachableHttpClient:
+        return get_shared_client(base_url="https://example.com")
+
+    # each loop gets its own connection pool
+    assert asyncio.run(_client()) is not asyncio.run(_client())
+    assert get_shared_client(base_url="https://example.com") is not (
+        get_shared_client(base_url="https://example.com")
+    )
+
+
+def test_controller_key_generation():
+    controller = PathBasedCacheController(
+        registries=[
+            CachableEndpoint(
+                path="/v1/a", methods=["POST"], key_generator=lambda r, b: b"a"
+            ),
+            CachableEndpoint(
+                path="/v1/b/c", methods=["POST"], key_generator=lambda r, b: b"b"
+            ),
+        ]
+    )
+
+    def _key(path: str, body: bytes) -> str:
+        return controller._generate_key(
+            httpcore.Request(method="POST", url=f"https://example.com{path}"), body
+        )
+
+    assert _key("/v1/a/1", b"x") == _key("/v1/a/2", b"y")
+    assert _key("/v1/b/c", b"x") == _key("/v1/b/c/d", b"y")
+    assert _key("/v1/a", b"x") != _key("/v1/b/c", b"x")
+    assert _key("/v1/d", b"x") != _key("/v1/d", b"y")
+
+
+def test_controller_cachable_methods():
+    controller = PathBasedCacheController(
+        registries=[CachableEndpoint(path="/v1/a", methods=["POST"])]
+    )
+    request = httpcore.Request(method="POST", url="https://example.com/v1/a/1")
+    assert controller.is_cachable(request, httpcore.Response(status=200))
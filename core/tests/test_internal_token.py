@@ -13,11 +13,17 @@
 #  limitations under the License.
 #
 
+import asyncio
+import base64
+import json
 import time
 
+import httpcore
 import httpx
 import pytest
-from alltrue_guardrails.control._internal.token import TokenRetriever
+from alltrue_guardrails.control import AlltrueAPIClient
+from alltrue_guardrails.control._internal import token as token_module
+from alltrue_guardrails.control._internal.token import TokenRetriever, _gen_cache_key
 from alltrue_guardrails.http.cache import CachableHttpClient
 from alltrue_guardrails.utils.config import AlltrueConfig
 
@@ -47,3 +53,204 @@ async def test_get_internal_access_token(httpx_mock):
     token = await retriever.get_token(refresh=True)
     assert token is not None
     assert token == await retriever.get_token()
+
+
+def test_token_cache_key():
+    request = httpcore.Request(method="POST", url="https://example.com")
+    assert _gen_cache_key(request, b'{"api_key":"key"}') == b'{"api_key":"key"}'
+    request = httpcore.Request(
+        method="POST",
+        url="https://example.com",
+        extensions={"alltrue_cache_key": "other-key"},
+    )
+    assert _gen_cache_key(request, b'{"api_key":"key"}') == b"other-key"
+
+
+@pytest.mark.asyncio
+async def test_reuse_unexpired_token(httpx_mock):
+    claims = base64.urlsafe_b64encode(
+        json.dumps({"exp": time.time() + 3600}).encode("utf-8")
+    ).decode("utf-8")
+    httpx_mock.add_response(json={"access_token": f"header.{claims}.signature"})
+
+    retriever = TokenRetriever(
+        config=AlltrueConfig(
+            api_url="https://example.com",
+            api_key="key",
+            llm_api_provider="any",
+        ),
+        client=CachableHttpClient(
+            base_url="https://example.com",
+        ),
+    )
+    token = await retriever.get_token(refresh=True)
+    assert token == await retriever.get_token()
+    assert len(httpx_mock.get_requests()) == 1
+
+
+@pytest.mark.asyncio
+async def test_coalesce_concurrent_refresh(httpx_mock):
+    httpx_mock.add_response(json={"access_token": "token"})
+
+    retriever = TokenRetriever(
+        config=AlltrueConfig(
+            api_url="https://example.com",
+            api_key="key",
+            llm_api_provider="any",
+        ),
+        client=CachableHttpClient(
+            base_url="https://example.com",
+        ),
+    )
+    tokens = await asyncio.gather(
+        *[retriever.get_token(refresh=True) for _ in range(5)]
+    )
+    assert tokens == ["token"] * 5
+    assert len(httpx_mock.get_requests()) == 1
+
+
+@pytest.mark.httpx_mock(can_send_already_matched_responses=True)
+@pytest.mark.asyncio
+async def test_fail_after_single_refresh(httpx_mock):
+    def _response(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("jwt-token"):
+            return httpx.Response(status_code=200, json={"access_token": "token"})
+        return httpx.Response(status_code=401)
+
+    httpx_mock.add_callback(_response)
+
+    client = AlltrueAPIClient(
+        api_url="https://example.com",
+        api_key="key",
+        llm_api_provider="any",
+    )
+    reply = await client._request(endpoint="/v1/endpoint")
+    assert reply.status_code == 401
+    # the current token, then a refreshed one, before giving up
+    assert [request.url.path for request in httpx_mock.get_requests()] == [
+        "/v1/auth/issue-jwt-token",
+        "/v1/endpoint",
+        "/v1/auth/issue-jwt-token",
+        "/v1/endpoint",
+    ]
+
+
+@pytest.mark.httpx_mock(can_send_already_matched_responses=True)
+@pytest.mark.asyncio
+async def test_refresh_not_sharing_cached_token(httpx_mock):
+    tokens = iter(["token-1", "token-2"])
+
+    def _response(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(status_code=200, json={"access_token": next(tokens)})
+
+    httpx_mock.add_callback(_response)
+
+    retriever = TokenRetriever(
+        config=AlltrueConfig(
+            api_url="https://example.com",
+            api_key="key",
+            llm_api_provider="any",
+        ),
+        client=CachableHttpClient(
+            base_url="https://example.com",
+        ),
+    )
+    # the refresh waits for the retrieval in progress, but still gets its own token
+    assert await asyncio.gather(
+        retriever.get_token(), retriever.get_token(refresh=True)
+    ) == ["token-1", "token-2"]
+    assert len(httpx_mock.get_requests()) == 2
+
+
+class _Clock:
+    """
+    Clock of the token module, to be moved ahead without affecting the event loop
+    """
+
+    offset = 0.0
+
+    @classmethod
+    def time(cls) -> float:
+        return time.time() + cls.offset
+
+    @classmethod
+    def monotonic(cls) -> float:
+        return time.monotonic() + cls.offset
+
+
+def _jwt(exp: float, jti: int) -> str:
+    claims = base64.urlsafe_b64encode(
+        json.dumps({"exp": exp, "jti": jti}).encode("utf-8")
+    ).decode("utf-8")
+    return f"header.{claims}.signature"
+
+
+@pytest.mark.httpx_mock(can_send_already_matched_responses=True)
+@pytest.mark.asyncio
+async def test_renew_token_within_expiry_margin(httpx_mock, monkeypatch):
+    monkeypatch.setattr(_Clock, "offset", 0.0)
+    monkeypatch.setattr(token_module, "time", _Clock)
+    issued: list[str] = []
+
+    def _response(request: httpx.Request) -> httpx.Response:
+        issued.append(_jwt(_Clock.time() + 3600, len(issued)))
+        return httpx.Response(status_code=200, json={"access_token": issued[-1]})
+
+    httpx_mock.add_callback(_response)
+
+    retriever = TokenRetriever(
+        config=AlltrueConfig(
+            api_url="https://example.com",
+            api_key="key",
+            llm_api_provider="any",
+        ),
+        client=CachableHttpClient(
+            base_url="https://example.com",
+        ),
+    )
+    assert await retriever.get_token() == issued[0]
+
+    # within the expiry margin, renewed instead of served from the HTTP cache
+    _Clock.offset = 3600 - 10
+    assert await retriever.get_token() == issued[1]
+    assert len(httpx_mock.get_requests()) == 2
+
+
+@pytest.mark.httpx_mock(can_send_already_matched_responses=True)
+@pytest.mark.asyncio
+async def test_refresh_token_ahead_of_expiry(httpx_mock, monkeypatch):
+    monkeypatch.setattr(_Clock, "offset", 0.0)
+    monkeypatch.setattr(token_module, "time", _Clock)
+    lifetimes = iter([3600, 45])
+    issued: list[str] = []
+
+    def _response(request: httpx.Request) -> httpx.Response:
+        issued.append(_jwt(_Clock.time() + next(lifetimes), len(issued)))
+        return httpx.Response(status_code=200, json={"access_token": issued[-1]})
+
+    httpx_mock.add_callback(_response)
+
+    retriever = TokenRetriever(
+        config=AlltrueConfig(
+            api_url="https://example.com",
+            api_key="key",
+            llm_api_provider="any",
+        ),
+        client=CachableHttpClient(
+            base_url="https://example.com",
+        ),
+    )
+    assert await retriever.get_token() == issued[0]
+
+    # within the refresh-ahead window, the current token is served until the renewed one lands
+    _Clock.offset = 3600 - 45
+    assert await retriever.get_token() == issued[0]
+    assert retriever._refresh_task is not None
+    await retriever._refresh_task
+    assert await retriever.get_token() == issued[1]
+
+    # a short-lived token is not renewed again right away
+    for _ in range(3):
+        assert await retriever.get_token() == issued[1]
+        await asyncio.sleep(0.01)
+    assert len(httpx_mock.get_requests()) == 2
@@ -14,7 +14,8 @@
 #
 
 import pytest
-from alltrue_guardrails.utils.logfire import LogfireMock, configure_logfire
+from alltrue_guardrails.utils import logfire as logfire_module
+from alltrue_guardrails.utils.logfire import LogfireMock, LogfireNoop, configure_logfire
 
 
 @pytest.mark.parametrize(
@@ -22,6 +23,7 @@ from alltrue_guardrails.utils.logfire import LogfireMock, configure_logfire
     [
         configure_logfire(),
         LogfireMock(),
+        LogfireNoop(),
     ],
 )
 def test_logfire(logfire):
@@ -33,3 +35,15 @@ def test_logfire(logfire):
 
     with logfire.span("def"):
         assert True
+
+
+@pytest.mark.parametrize("configured", [None, LogfireMock()])
+def test_force_configure_when_disabled(monkeypatch, configured):
+    monkeypatch.setenv("ALLTRUE_DISABLE_LOGFIRE", "1")
+    monkeypatch.setattr(logfire_module, "_LOGFIRE", configured)
+
+    def _configure(**kwargs):
+        raise AssertionError("configured while disabled")
+
+    monkeypatch.setattr(logfire_module, "_configure", _configure)
+    assert isinstance(configure_logfire(force=True), LogfireNoop)
@@ -14,6 +14,8 @@
 #
 
 import pytest
+from alltrue_guardrails.utils import serialization
+from alltrue_guardrails.utils.config import AlltrueConfig
 from alltrue_guardrails.utils.path import EndpointInfo
 
 
@@ -179,3 +181,26 @@ def test_parse_no_path():
     assert parsed.endpoint_identifier == "random"
 
     assert parsed.compose_path() == path
+
+
+def test_serialization_roundtrip():
+    payload = {"requests": [{"content": "ünïcode", "n": 1}, None]}
+    dumped = serialization.dumps(payload)
+    assert isinstance(dumped, bytes)
+    assert serialization.loads(dumped) == payload
+
+
+@pytest.mark.parametrize(
+    "configured, expected",
+    [
+        ("openai", "openai"),
+        ("gemini", "google"),
+    ],
+)
+def test_config_api_provider(monkeypatch, configured, expected):
+    monkeypatch.delenv("CONFIG_LLM_API_PROVIDER", raising=False)
+    config = AlltrueConfig(api_key="api_key")
+    monkeypatch.setenv("CONFIG_LLM_API_PROVIDER", configured)
+    assert config.llm_api_provider == expected
+    with pytest.raises(AttributeError):
+        config.api_key = "another_key"  # type: ignore
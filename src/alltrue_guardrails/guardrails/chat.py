@@ -16,9 +16,9 @@
 import asyncio
 import json
 import logging
+import time
 import uuid
 from abc import ABC
-from datetime import UTC, datetime
 from typing import Any, Callable
 
 from alltrue_guardrails.control.batch import BatchRuleProcessor
@@ -307,7 +307,7 @@ class ChatGuardrails(ChatGuardian):
             before=lambda messages: json.dumps(
                 {
                     "id": str(uuid.uuid4()),
-                    "created": int(datetime.now(UTC).timestamp()),
+                    "created": int(time.time()),
                     "object": "chat.completion",
                     "model": "gpt-4o",
                     "choices": [
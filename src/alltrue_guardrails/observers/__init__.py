@@ -297,17 +297,13 @@ class BaseObserver:
         """
         if self._batch_control is None:
             self._rule_processor = RuleProcessor(
-                llm_api_provider=self._config.llm_api_provider,
-                api_url=self._config.api_url,
-                api_key=self._config.api_key,
+                _config=self._config,
                 **self._api_control,
             )
         else:
             self._log.info("Batching enabled")
             self._rule_processor = BatchRuleProcessor(
-                llm_api_provider=self._config.llm_api_provider,
-                api_url=self._config.api_url,
-                api_key=self._config.api_key,
+                _config=self._config,
                 **self._api_control,
                 **self._batch_control,
             )